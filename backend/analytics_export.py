@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""Offline analytics export.
+
+Streams ``users``, ``swap_requests`` and ``ratings`` out of Mongo in batches,
+reading from a secondary when the deployment has one, into date-partitioned
+Parquet datasets. Exports are incremental: each run only pulls documents
+from the watermark saved by the previous run, minus a safety window.
+
+    python analytics_export.py export --out ./analytics
+    python analytics_export.py report --out ./analytics
+
+Run it from cron or any scheduler; it never touches the API.
+"""
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import typer
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+
+# Collection -> field used as the incremental watermark and partition date.
+# Documents written before the field existed fall back to created_at.
+EXPORTS = {
+    "users": "updated_at",
+    "swap_requests": "updated_at",
+    "ratings": "created_at",
+}
+# Fixed schemas so every batch writes the same column types, even when a
+# batch happens to have only nulls in an optional field.
+TIMESTAMP = pa.timestamp("ms")
+SCHEMAS = {
+    "users": pa.schema([
+        ("id", pa.string()),
+        ("name", pa.string()),
+        ("email", pa.string()),
+        ("location", pa.string()),
+        ("profile_photo", pa.string()),
+        ("skills_offered", pa.list_(pa.string())),
+        ("skills_wanted", pa.list_(pa.string())),
+        ("availability", pa.string()),
+        ("is_public", pa.bool_()),
+        ("status", pa.string()),
+        ("rating", pa.float64()),
+        ("total_ratings", pa.int64()),
+        ("created_at", TIMESTAMP),
+        ("updated_at", TIMESTAMP),
+    ]),
+    "swap_requests": pa.schema([
+        ("id", pa.string()),
+        ("requester_id", pa.string()),
+        ("receiver_id", pa.string()),
+        ("requester_skill", pa.string()),
+        ("receiver_skill", pa.string()),
+        ("message", pa.string()),
+        ("status", pa.string()),
+        ("created_at", TIMESTAMP),
+        ("updated_at", TIMESTAMP),
+    ]),
+    "ratings": pa.schema([
+        ("id", pa.string()),
+        ("swap_request_id", pa.string()),
+        ("rater_id", pa.string()),
+        ("rated_user_id", pa.string()),
+        ("rating", pa.int64()),
+        ("feedback", pa.string()),
+        ("created_at", TIMESTAMP),
+    ]),
+}
+STATE_FILE = "_export_state.json"
+
+app = typer.Typer(help="Export Mongo collections to Parquet and build summary reports.")
+
+def get_database():
+    from pymongo import MongoClient, ReadPreference
+
+    load_dotenv(ROOT_DIR / '.env')
+    client = MongoClient(os.environ['MONGO_URL'])
+    # Keep reporting load off the primary; falls back to it on standalone servers
+    return client.get_database(
+        os.environ['DB_NAME'], read_preference=ReadPreference.SECONDARY_PREFERRED
+    )
+
+def load_state(out_dir: Path) -> Dict[str, str]:
+    path = out_dir / STATE_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+def save_state(out_dir: Path, state: Dict[str, str]):
+    (out_dir / STATE_FILE).write_text(json.dumps(state, indent=2, sort_keys=True))
+
+def iter_batches(cursor, batch_size: int) -> Iterator[List[dict]]:
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def export_collection(
+    collection, dataset_dir: Path, field: str, since: Optional[datetime], batch_size: int
+) -> Optional[datetime]:
+    """Append documents from ``since`` onwards to ``dataset_dir/dt=YYYY-MM-DD/``.
+
+    Every row is stamped with this run's ``exported_at`` so readers can tell
+    which copy of a re-exported document is the latest.
+
+    Returns the new watermark, or ``None`` when nothing was exported.
+    """
+    exported_at = datetime.utcnow()
+    schema = SCHEMAS[collection.name]
+    # Legacy documents without the watermark field use created_at instead
+    pipeline = [{"$addFields": {field: {"$ifNull": [f"${field}", "$created_at"]}}}]
+    if since:
+        pipeline.append({"$match": {field: {"$gte": since}}})
+    pipeline += [
+        {"$sort": {field: 1}},
+        {"$project": {"_id": 0, **{name: 1 for name in schema.names}}},
+    ]
+    cursor = collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
+    watermark = None
+    for batch in iter_batches(cursor, batch_size):
+        table = pa.Table.from_pylist(batch, schema=schema)
+        dates = pc.strftime(table[field], format="%Y-%m-%d")
+        table = table.append_column("exported_at", pa.array([exported_at] * len(batch), TIMESTAMP))
+        table = table.append_column("dt", dates)
+        pq.write_to_dataset(table, dataset_dir, partition_cols=["dt"])
+        # The cursor is sorted on the watermark field, so the last row is the max
+        watermark = batch[-1][field]
+    return watermark
+
+@app.command()
+def export(
+    out: Path = typer.Option(Path("analytics"), help="Output directory for the Parquet datasets"),
+    batch_size: int = typer.Option(5000, help="Documents per Mongo batch and Parquet file"),
+    full: bool = typer.Option(False, help="Re-export everything into a fresh snapshot that replaces the datasets"),
+    lag_seconds: int = typer.Option(600, help="Re-read this much before the saved watermark"),
+):
+    """Export collections incrementally to partitioned Parquet."""
+    out.mkdir(parents=True, exist_ok=True)
+    db = get_database()
+    state = load_state(out)
+    for name, field in EXPORTS.items():
+        since = None
+        if name in state and not full:
+            # Timestamps come from the app clock and reads may hit a lagging
+            # secondary, so documents just behind the watermark can still
+            # appear; re-read them and let read_dataset dedupe by id
+            since = datetime.fromisoformat(state[name]) - timedelta(seconds=lag_seconds)
+        if full:
+            # Build a fresh snapshot next to the old one and swap it in, so a
+            # full run replaces the dataset instead of duplicating it
+            dataset_dir = out / f".{name}.full"
+            shutil.rmtree(dataset_dir, ignore_errors=True)
+        else:
+            dataset_dir = out / name
+        watermark = export_collection(db[name], dataset_dir, field, since, batch_size)
+        if full:
+            shutil.rmtree(out / name, ignore_errors=True)
+            if dataset_dir.exists():
+                dataset_dir.rename(out / name)
+        if watermark:
+            state[name] = watermark.isoformat()
+            # Save after each collection so a failure does not redo finished work
+            save_state(out, state)
+        typer.echo(f"{name}: exported up to {state.get(name, 'nothing')}")
+
+def read_dataset(out_dir: Path, name: str) -> pd.DataFrame:
+    path = out_dir / name
+    if not path.exists():
+        return pd.DataFrame()
+    df = pd.read_parquet(path)
+    # Incremental runs append new versions of updated documents; keep the
+    # latest, using the export run to break ties on the watermark field
+    df = df.sort_values([EXPORTS[name], "exported_at"], kind="stable")
+    return df.drop_duplicates("id", keep="last").drop(columns="exported_at")
+
+def skill_supply_demand(users: pd.DataFrame) -> pd.DataFrame:
+    """Skill counts over active public users, the same set search shows."""
+    if not users.empty:
+        users = users[(users["status"] == "active") & users["is_public"].fillna(False)]
+    if users.empty:
+        return pd.DataFrame(columns=["supply", "demand", "demand_ratio"])
+    supply = users["skills_offered"].explode().dropna().str.strip().str.lower().value_counts()
+    demand = users["skills_wanted"].explode().dropna().str.strip().str.lower().value_counts()
+    report = pd.concat({"supply": supply, "demand": demand}, axis=1).fillna(0).astype(int)
+    report["demand_ratio"] = report["demand"] / report["supply"].replace(0, np.nan)
+    return report.sort_values(["demand", "supply"], ascending=False)
+
+def swap_status_breakdown(swaps: pd.DataFrame) -> pd.DataFrame:
+    if swaps.empty:
+        return pd.DataFrame(columns=["count", "share"])
+    counts = swaps["status"].value_counts()
+    return pd.DataFrame({"count": counts, "share": counts / counts.sum()})
+
+def swap_conversion_rates(swaps: pd.DataFrame) -> pd.Series:
+    status = swaps["status"] if not swaps.empty else pd.Series(dtype=str)
+    decided = status.isin(["accepted", "rejected", "completed"])
+    accepted = status.isin(["accepted", "completed"])
+    return pd.Series({
+        "total": len(status),
+        # Share of answered requests that were accepted (pending/cancelled excluded)
+        "acceptance_rate": accepted.sum() / decided.sum() if decided.any() else np.nan,
+        "completion_rate": (status == "completed").mean() if len(status) else np.nan,
+    })
+
+@app.command()
+def report(
+    out: Path = typer.Option(Path("analytics"), help="Directory written by the export command"),
+    top: int = typer.Option(20, help="Number of skills to show"),
+):
+    """Print skill supply/demand and swap conversion summaries."""
+    users = read_dataset(out, "users")
+    swaps = read_dataset(out, "swap_requests")
+    ratings = read_dataset(out, "ratings")
+
+    typer.echo("Skill supply/demand (active public users)")
+    typer.echo(skill_supply_demand(users).head(top).to_string())
+    typer.echo("\nSwap conversion")
+    typer.echo(swap_status_breakdown(swaps).to_string())
+    typer.echo(swap_conversion_rates(swaps).to_string())
+    if not ratings.empty:
+        typer.echo(f"\nRatings: {len(ratings)} total, mean {ratings['rating'].mean():.2f}")
+
+if __name__ == "__main__":
+    app()
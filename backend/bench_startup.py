@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Startup-time benchmark for the backend.
+
+Measures, each in a fresh interpreter so nothing is cached between runs:
+
+* ``import``   - importing ``server``
+* ``factory``  - ``create_app()``
+* ``lifespan`` - entering the app lifespan (dotenv + Mongo client setup)
+
+Index builds run in a background task started by the lifespan and are not
+waited on, so they are not part of the measurement.
+
+Usage: python bench_startup.py [--runs N]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+
+PROBE = '''
+import asyncio, json, time
+t0 = time.perf_counter()
+import server
+t1 = time.perf_counter()
+app = server.create_app()
+t2 = time.perf_counter()
+
+async def enter_lifespan():
+    async with server.lifespan(app):
+        return time.perf_counter()
+
+t3 = asyncio.run(enter_lifespan())
+print(json.dumps({"import": t1 - t0, "factory": t2 - t1, "lifespan": t3 - t2}))
+'''
+
+def run_probe() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    samples = [run_probe() for _ in range(args.runs)]
+    print(f"{'phase':<10} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for phase in ("import", "factory", "lifespan"):
+        values = [s[phase] * 1000 for s in samples]
+        print(f"{phase:<10} {statistics.median(values):>10.1f} {min(values):>10.1f} {max(values):>10.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,136 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Query
-from dotenv import load_dotenv
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Depends, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateMany
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from contextlib import asynccontextmanager
 import os
+import sys
+import json
+import asyncio
+import hashlib
+import secrets
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import TYPE_CHECKING, List, Optional, Dict, Any
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
 
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorDatabase
+
 ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+
+# Create a router with the /api prefix
+api_router = APIRouter(prefix="/api")
 
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+def connect():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
 
-# Create the main app without a prefix
-app = FastAPI()
+    load_dotenv(ROOT_DIR / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    return client, client[os.environ['DB_NAME']]
 
-# Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+# The client is created per worker inside the app lifespan, never at import
+# time: a client built before a pre-fork server forks is not fork-safe.
+# Indexes are built by a background task so startup never waits on (or fails
+# with) the database; ``python server.py ensure-indexes`` does the same as a
+# deploy step.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    client, db = connect()
+    app.state.mongo_client = client
+    app.state.db = db
+    # Idempotency-Key requests are refused until the build confirms the index
+    # that makes key reservations unique
+    app.state.idempotency_ready = False
+    index_task = asyncio.create_task(build_indexes(app))
+    try:
+        yield
+    finally:
+        index_task.cancel()
+        client.close()
+
+def get_db(request: Request) -> "AsyncIOMotorDatabase":
+    return request.app.state.db
+
+def get_idempotency_key(request: Request, idempotency_key: Optional[str] = Header(None)) -> Optional[str]:
+    if idempotency_key and not getattr(request.app.state, "idempotency_ready", False):
+        raise HTTPException(status_code=503, detail="Idempotency-Key support is not ready yet, retry shortly")
+    return idempotency_key
+
+# Seconds between background index build attempts while Mongo is unreachable
+INDEX_RETRY_DELAY = 30
+
+async def build_indexes(app: FastAPI):
+    while True:
+        try:
+            await ensure_indexes(app.state.db)
+            app.state.idempotency_ready = await idempotency_index_exists(app.state.db)
+            return
+        except Exception:
+            logger.exception("Index build failed, retrying in %ss", INDEX_RETRY_DELAY)
+            await asyncio.sleep(INDEX_RETRY_DELAY)
+
+async def idempotency_index_exists(db: "AsyncIOMotorDatabase") -> bool:
+    indexes = await db.idempotency_keys.index_information()
+    return any(
+        index.get("unique") and [field for field, _ in index["key"]] == ["key", "scope"]
+        for index in indexes.values()
+    )
+
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+# Upper bound for GET /users?ids=..., well below the to_list limit
+MAX_BATCH_IDS = 100
+# How long an unfinished reservation blocks retries before one may take it over
+IDEMPOTENCY_LEASE = timedelta(seconds=30)
+# Case-insensitive matching for skill filters, shared by the query and its indexes
+SKILL_COLLATION = {"locale": "en", "strength": 2}
+
+async def ensure_indexes(db: "AsyncIOMotorDatabase") -> bool:
+    """Build all indexes; returns False if any unique index could not be built."""
+    built = []
+    # Batch user lookups and participant expansion resolve users by id with $in
+    built.append(await create_unique_index(db.users, "id"))
+    built.append(await create_unique_index(db.users, "email"))
+    # At most one pending swap per (requester, receiver, skills) tuple
+    built.append(await create_unique_index(
+        db.swap_requests,
+        [("requester_id", 1), ("receiver_id", 1), ("requester_skill", 1), ("receiver_skill", 1)],
+        name="unique_pending_swap",
+        partialFilterExpression={"status": SwapStatus.PENDING.value},
+    ))
+    built.append(await create_unique_index(db.ratings, [("swap_request_id", 1), ("rater_id", 1)]))
+    # Browse and search only ever read active public users; these partial
+    # indexes leave banned and private rows out entirely
+    await db.users.create_index("status", name="active_public_status", partialFilterExpression=ACTIVE_PUBLIC_USER)
+    await db.users.create_index("location", name="active_public_location", partialFilterExpression=ACTIVE_PUBLIC_USER)
+    for field in ("skills_offered", "skills_wanted"):
+        await db.users.create_index(
+            field,
+            name=f"active_public_{field}",
+            partialFilterExpression=ACTIVE_PUBLIC_USER,
+            collation=SKILL_COLLATION,
+        )
+    built.append(await create_unique_index(db.idempotency_keys, [("key", 1), ("scope", 1)]))
+    await db.idempotency_keys.create_index(
+        "created_at", expireAfterSeconds=int(IDEMPOTENCY_KEY_TTL.total_seconds())
+    )
+    return all(built)
+
+async def create_unique_index(collection, keys, **kwargs) -> bool:
+    try:
+        await collection.create_index(keys, unique=True, **kwargs)
+    except OperationFailure as e:
+        # Existing duplicates block the build; build the rest and report it
+        logger.error("Could not create unique index %s on %s: %s", keys, collection.name, e)
+        return False
+    return True
 
 # Enums
 class SwapStatus(str, Enum):
@@ -37,6 +144,9 @@ class UserStatus(str, Enum):
     ACTIVE = "active"
     BANNED = "banned"
 
+ACTIVE_USER = {"status": UserStatus.ACTIVE.value}
+ACTIVE_PUBLIC_USER = {**ACTIVE_USER, "is_public": True}
+
 # Models
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -52,6 +162,24 @@ class User(BaseModel):
     rating: float = 0.0
     total_ratings: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class UserSummary(BaseModel):
+    id: str
+    name: str
+    profile_photo: Optional[str] = None
+    location: Optional[str] = None
+    rating: float = 0.0
+
+USER_SUMMARY_PROJECTION = {"_id": 0, "id": 1, "name": 1, "profile_photo": 1, "location": 1, "rating": 1}
+
+class BulkModeration(BaseModel):
+    ban: List[str] = []
+    unban: List[str] = []
+
+class BulkModerationResult(BaseModel):
+    users_modified: int
+    swaps_cancelled: int
 
 class UserCreate(BaseModel):
     name: str
@@ -79,6 +207,10 @@ class SwapRequest(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class SwapRequestWithParticipants(SwapRequest):
+    requester: Optional[UserSummary] = None
+    receiver: Optional[UserSummary] = None
+
 class SwapRequestCreate(BaseModel):
     receiver_id: str
     requester_skill: str
@@ -103,70 +235,173 @@ class RatingCreate(BaseModel):
     rating: int
     feedback: Optional[str] = None
 
+# Idempotency
+async def idempotent(db: "AsyncIOMotorDatabase", key: Optional[str], scope: str, payload: BaseModel, create):
+    """Run ``create`` once per Idempotency-Key and replay its stored response on retries."""
+    if not key:
+        return await create()
+    fingerprint = hashlib.sha256(
+        json.dumps(jsonable_encoder(payload), sort_keys=True).encode()
+    ).hexdigest()
+    lookup = {"key": key, "scope": scope}
+    now = datetime.utcnow()
+    try:
+        await db.idempotency_keys.insert_one({
+            **lookup,
+            "fingerprint": fingerprint,
+            "response": None,
+            "locked_until": now + IDEMPOTENCY_LEASE,
+            "created_at": now,
+        })
+    except DuplicateKeyError:
+        # A reservation whose holder died without finishing or releasing it
+        # is taken over once its lease expires
+        taken = await db.idempotency_keys.find_one_and_update(
+            {**lookup, "fingerprint": fingerprint, "response": None, "locked_until": {"$lt": now}},
+            {"$set": {"locked_until": now + IDEMPOTENCY_LEASE}},
+        )
+        if not taken:
+            stored = await db.idempotency_keys.find_one(lookup)
+            if stored and stored["fingerprint"] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was reused with a different request")
+            if not stored or stored["response"] is None:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress")
+            return JSONResponse(content=stored["response"])
+    
+    try:
+        result = await create()
+    except BaseException:
+        # Release the key so a retry can run the request again, including
+        # when the request is cancelled mid-flight
+        await db.idempotency_keys.delete_one(lookup)
+        raise
+    await db.idempotency_keys.update_one(lookup, {"$set": {"response": jsonable_encoder(result)}})
+    return result
+
 # User endpoints
 @api_router.post("/users", response_model=User)
-async def create_user(user_data: UserCreate):
+async def create_user(
+    user_data: UserCreate,
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
+    db=Depends(get_db)
+):
+    return await idempotent(db, idempotency_key, "users", user_data, lambda: insert_user(db, user_data))
+
+async def insert_user(db: "AsyncIOMotorDatabase", user_data: UserCreate) -> User:
     # Check if email already exists
     existing_user = await db.users.find_one({"email": user_data.email})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     user = User(**user_data.dict())
-    await db.users.insert_one(user.dict())
+    try:
+        await db.users.insert_one(user.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     return user
 
 @api_router.get("/users", response_model=List[User])
 async def get_users(
     skill: Optional[str] = Query(None),
     location: Optional[str] = Query(None),
-    public_only: bool = Query(True)
+    public_only: bool = Query(True),
+    ids: Optional[str] = Query(None, description="Comma-separated user ids to fetch in one call"),
+    db=Depends(get_db)
 ):
-    query = {}
-    if public_only:
+    query = dict(ACTIVE_USER)
+    if ids:
+        # Explicit id lookups behave like GET /users/{user_id} and ignore visibility
+        query["id"] = {"$in": parse_ids(ids)}
+    elif public_only:
         query["is_public"] = True
     if location:
         query["location"] = {"$regex": location, "$options": "i"}
     
-    users = await db.users.find(query).to_list(1000)
-    
-    # Filter by skill if provided
     if skill:
-        filtered_users = []
-        for user_dict in users:
-            user = User(**user_dict)
-            if (skill.lower() in [s.lower() for s in user.skills_offered] or 
-                skill.lower() in [s.lower() for s in user.skills_wanted]):
-                filtered_users.append(user)
-        return filtered_users
+        # Filter by skill in Mongo so the active_public_skills_* indexes apply
+        query["$or"] = [{"skills_offered": skill}, {"skills_wanted": skill}]
+        cursor = db.users.find(query, collation=SKILL_COLLATION)
+    else:
+        cursor = db.users.find(query)
     
+    users = await cursor.to_list(1000)
     return [User(**user) for user in users]
 
 @api_router.get("/users/{user_id}", response_model=User)
-async def get_user(user_id: str):
-    user = await db.users.find_one({"id": user_id})
+async def get_user(user_id: str, db=Depends(get_db)):
+    user = await db.users.find_one({"id": user_id, **ACTIVE_USER})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return User(**user)
 
 @api_router.put("/users/{user_id}", response_model=User)
-async def update_user(user_id: str, user_update: UserUpdate):
-    user = await db.users.find_one({"id": user_id})
+async def update_user(user_id: str, user_update: UserUpdate, db=Depends(get_db)):
+    user = await db.users.find_one({"id": user_id, **ACTIVE_USER})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     update_data = user_update.dict(exclude_unset=True)
     if update_data:
+        update_data["updated_at"] = datetime.utcnow()
         await db.users.update_one({"id": user_id}, {"$set": update_data})
     
     updated_user = await db.users.find_one({"id": user_id})
     return User(**updated_user)
 
+def parse_ids(ids: str) -> List[str]:
+    user_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if len(user_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids can be fetched at once")
+    return user_ids
+
+async def fetch_user_summaries(db: "AsyncIOMotorDatabase", user_ids) -> Dict[str, UserSummary]:
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return {}
+    users = await db.users.find(
+        {"id": {"$in": user_ids}, **ACTIVE_USER}, USER_SUMMARY_PROJECTION
+    ).to_list(len(user_ids))
+    return {user["id"]: UserSummary(**user) for user in users}
+
+async def expand_participants(db: "AsyncIOMotorDatabase", requests: List[dict]) -> List[SwapRequestWithParticipants]:
+    summaries = await fetch_user_summaries(
+        db, [uid for req in requests for uid in (req["requester_id"], req["receiver_id"])]
+    )
+    return [
+        SwapRequestWithParticipants(
+            **req,
+            requester=summaries.get(req["requester_id"]),
+            receiver=summaries.get(req["receiver_id"]),
+        )
+        for req in requests
+    ]
+
+def check_expand(expand: Optional[str]) -> bool:
+    if expand is None:
+        return False
+    if expand != "participants":
+        raise HTTPException(status_code=400, detail="expand must be 'participants'")
+    return True
+
 # Swap request endpoints
 @api_router.post("/swap-requests", response_model=SwapRequest)
-async def create_swap_request(requester_id: str, request_data: SwapRequestCreate):
-    # Verify users exist
-    requester = await db.users.find_one({"id": requester_id})
-    receiver = await db.users.find_one({"id": request_data.receiver_id})
+async def create_swap_request(
+    requester_id: str,
+    request_data: SwapRequestCreate,
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
+    db=Depends(get_db)
+):
+    return await idempotent(
+        db, idempotency_key, f"swap-requests:{requester_id}", request_data,
+        lambda: insert_swap_request(db, requester_id, request_data),
+    )
+
+async def insert_swap_request(
+    db: "AsyncIOMotorDatabase", requester_id: str, request_data: SwapRequestCreate
+) -> SwapRequest:
+    # Verify users exist and are not banned
+    requester = await db.users.find_one({"id": requester_id, **ACTIVE_USER})
+    receiver = await db.users.find_one({"id": request_data.receiver_id, **ACTIVE_USER})
     
     if not requester or not receiver:
         raise HTTPException(status_code=404, detail="User not found")
@@ -175,32 +410,57 @@ async def create_swap_request(requester_id: str, request_data: SwapRequestCreate
         raise HTTPException(status_code=400, detail="Cannot send request to yourself")
     
     swap_request = SwapRequest(requester_id=requester_id, **request_data.dict())
-    await db.swap_requests.insert_one(swap_request.dict())
+    try:
+        await db.swap_requests.insert_one(swap_request.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A pending swap request for these skills already exists")
     return swap_request
 
-@api_router.get("/swap-requests", response_model=List[SwapRequest])
-async def get_swap_requests(user_id: Optional[str] = Query(None)):
+@api_router.get(
+    "/swap-requests",
+    response_model=List[SwapRequestWithParticipants],
+    response_model_exclude_unset=True,
+)
+async def get_swap_requests(
+    user_id: Optional[str] = Query(None),
+    expand: Optional[str] = Query(None, description="Set to 'participants' to embed user summaries"),
+    db=Depends(get_db)
+):
+    expand_users = check_expand(expand)
     query = {}
     if user_id:
         query = {"$or": [{"requester_id": user_id}, {"receiver_id": user_id}]}
     
     requests = await db.swap_requests.find(query).sort("created_at", -1).to_list(1000)
+    if expand_users:
+        return await expand_participants(db, requests)
     return [SwapRequest(**req) for req in requests]
 
 @api_router.put("/swap-requests/{request_id}", response_model=SwapRequest)
-async def update_swap_request(request_id: str, update_data: SwapRequestUpdate):
+async def update_swap_request(request_id: str, update_data: SwapRequestUpdate, db=Depends(get_db)):
     request = await db.swap_requests.find_one({"id": request_id})
     if not request:
         raise HTTPException(status_code=404, detail="Swap request not found")
     
+    # Swaps involving a banned user can still be rejected or cancelled, not progressed
+    if update_data.status in (SwapStatus.ACCEPTED, SwapStatus.COMPLETED):
+        participant_ids = [request["requester_id"], request["receiver_id"]]
+        active = await db.users.count_documents({"id": {"$in": participant_ids}, **ACTIVE_USER})
+        if active < len(participant_ids):
+            raise HTTPException(status_code=403, detail="A participant of this swap is banned")
+    
     update_dict = {"status": update_data.status, "updated_at": datetime.utcnow()}
-    await db.swap_requests.update_one({"id": request_id}, {"$set": update_dict})
+    try:
+        await db.swap_requests.update_one({"id": request_id}, {"$set": update_dict})
+    except DuplicateKeyError:
+        # Reopening a swap that already has a pending duplicate
+        raise HTTPException(status_code=409, detail="A pending swap request for these skills already exists")
     
     updated_request = await db.swap_requests.find_one({"id": request_id})
     return SwapRequest(**updated_request)
 
 @api_router.delete("/swap-requests/{request_id}")
-async def delete_swap_request(request_id: str):
+async def delete_swap_request(request_id: str, db=Depends(get_db)):
     result = await db.swap_requests.delete_one({"id": request_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Swap request not found")
@@ -208,7 +468,23 @@ async def delete_swap_request(request_id: str):
 
 # Rating endpoints
 @api_router.post("/ratings", response_model=Rating)
-async def create_rating(rater_id: str, rating_data: RatingCreate):
+async def create_rating(
+    rater_id: str,
+    rating_data: RatingCreate,
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
+    db=Depends(get_db)
+):
+    return await idempotent(
+        db, idempotency_key, f"ratings:{rater_id}", rating_data,
+        lambda: insert_rating(db, rater_id, rating_data),
+    )
+
+async def insert_rating(db: "AsyncIOMotorDatabase", rater_id: str, rating_data: RatingCreate) -> Rating:
+    # Both the rater and the rated user must exist and not be banned
+    user_ids = list({rater_id, rating_data.rated_user_id})
+    if await db.users.count_documents({"id": {"$in": user_ids}, **ACTIVE_USER}) < len(user_ids):
+        raise HTTPException(status_code=404, detail="User not found")
+    
     # Verify swap request exists and is completed
     swap_request = await db.swap_requests.find_one({"id": rating_data.swap_request_id})
     if not swap_request or swap_request["status"] != SwapStatus.COMPLETED:
@@ -230,28 +506,37 @@ async def create_rating(rater_id: str, rating_data: RatingCreate):
         raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
     
     rating = Rating(rater_id=rater_id, **rating_data.dict())
-    await db.ratings.insert_one(rating.dict())
+    try:
+        await db.ratings.insert_one(rating.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Already rated this swap")
     
     # Update user's average rating
-    await update_user_rating(rating_data.rated_user_id)
+    await update_user_rating(db, rating_data.rated_user_id)
     
     return rating
 
-async def update_user_rating(user_id: str):
+async def update_user_rating(db: "AsyncIOMotorDatabase", user_id: str):
     ratings = await db.ratings.find({"rated_user_id": user_id}).to_list(1000)
     if ratings:
         total_rating = sum(r["rating"] for r in ratings)
         avg_rating = total_rating / len(ratings)
         await db.users.update_one(
             {"id": user_id},
-            {"$set": {"rating": round(avg_rating, 1), "total_ratings": len(ratings)}}
+            {"$set": {
+                "rating": round(avg_rating, 1),
+                "total_ratings": len(ratings),
+                "updated_at": datetime.utcnow(),
+            }}
         )
 
 # Search endpoints
 @api_router.get("/search/skills")
-async def search_skills(query: str = Query(..., min_length=1)):
-    # Get all unique skills from all users
-    users = await db.users.find({"is_public": True}).to_list(1000)
+async def search_skills(query: str = Query(..., min_length=1), db=Depends(get_db)):
+    # Get all unique skills from all active public users
+    users = await db.users.find(
+        ACTIVE_PUBLIC_USER, {"_id": 0, "skills_offered": 1, "skills_wanted": 1}
+    ).to_list(1000)
     all_skills = set()
     
     for user in users:
@@ -262,10 +547,64 @@ async def search_skills(query: str = Query(..., min_length=1)):
     matching_skills = [skill for skill in all_skills if query.lower() in skill.lower()]
     return {"skills": sorted(matching_skills)}
 
+# Moderation endpoints
+def require_moderator(moderation_token: Optional[str] = Header(None, alias="X-Moderation-Token")):
+    # Moderation stays disabled unless an admin token is configured
+    expected = os.environ.get("MODERATION_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=503, detail="Moderation is not configured")
+    if not moderation_token or not secrets.compare_digest(moderation_token, expected):
+        raise HTTPException(status_code=401, detail="Invalid moderation token")
+
+@api_router.post(
+    "/moderation/users",
+    response_model=BulkModerationResult,
+    dependencies=[Depends(require_moderator)],
+)
+async def moderate_users(moderation: BulkModeration, db=Depends(get_db)):
+    if set(moderation.ban) & set(moderation.unban):
+        raise HTTPException(status_code=400, detail="A user cannot be banned and unbanned at once")
+    
+    now = datetime.utcnow()
+    user_ops = []
+    if moderation.ban:
+        user_ops.append(UpdateMany(
+            {"id": {"$in": moderation.ban}}, {"$set": {"status": UserStatus.BANNED.value, "updated_at": now}}
+        ))
+    if moderation.unban:
+        user_ops.append(UpdateMany(
+            {"id": {"$in": moderation.unban}}, {"$set": {"status": UserStatus.ACTIVE.value, "updated_at": now}}
+        ))
+    if not user_ops:
+        return BulkModerationResult(users_modified=0, swaps_cancelled=0)
+    
+    users_result = await db.users.bulk_write(user_ops, ordered=False)
+    
+    swaps_cancelled = 0
+    if moderation.ban:
+        # Cancel every pending swap the banned users sent or received
+        swaps_result = await db.swap_requests.bulk_write([
+            UpdateMany(
+                {"status": SwapStatus.PENDING.value, field: {"$in": moderation.ban}},
+                {"$set": {"status": SwapStatus.CANCELLED.value, "updated_at": now}},
+            )
+            for field in ("requester_id", "receiver_id")
+        ], ordered=False)
+        swaps_cancelled = swaps_result.modified_count
+    
+    return BulkModerationResult(
+        users_modified=users_result.modified_count, swaps_cancelled=swaps_cancelled
+    )
+
 # Dashboard endpoint
 @api_router.get("/dashboard/{user_id}")
-async def get_dashboard(user_id: str):
-    user = await db.users.find_one({"id": user_id})
+async def get_dashboard(
+    user_id: str,
+    expand: Optional[str] = Query(None, description="Set to 'participants' to embed user summaries"),
+    db=Depends(get_db)
+):
+    expand_users = check_expand(expand)
+    user = await db.users.find_one({"id": user_id, **ACTIVE_USER})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -277,25 +616,21 @@ async def get_dashboard(user_id: str):
     ratings_given = await db.ratings.find({"rater_id": user_id}).to_list(1000)
     ratings_received = await db.ratings.find({"rated_user_id": user_id}).to_list(1000)
     
+    if expand_users:
+        expanded = await expand_participants(db, sent_requests + received_requests)
+        sent, received = expanded[:len(sent_requests)], expanded[len(sent_requests):]
+    else:
+        sent = [SwapRequest(**req) for req in sent_requests]
+        received = [SwapRequest(**req) for req in received_requests]
+    
     return {
         "user": User(**user),
-        "sent_requests": [SwapRequest(**req) for req in sent_requests],
-        "received_requests": [SwapRequest(**req) for req in received_requests],
+        "sent_requests": sent,
+        "received_requests": received,
         "ratings_given": len(ratings_given),
         "ratings_received": len(ratings_received)
     }
 
-# Include the router in the main app
-app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -303,6 +638,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+def create_app() -> FastAPI:
+    """Build the ASGI app; run with ``uvicorn --factory server:create_app``."""
+    app = FastAPI(lifespan=lifespan)
+
+    # Include the router in the main app
+    app.include_router(api_router)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return app
+
+# Module-level instance for ``uvicorn server:app``; creating it touches no
+# config or database.
+app = create_app()
+
+async def ensure_indexes_command() -> int:
+    client, db = connect()
+    try:
+        ok = await ensure_indexes(db)
+    finally:
+        client.close()
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backend management commands")
+    parser.add_argument("command", choices=["ensure-indexes"])
+    args = parser.parse_args()
+    sys.exit(asyncio.run(ensure_indexes_command()))
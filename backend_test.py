@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import requests
+import os
 import sys
 import json
 from datetime import datetime
@@ -24,10 +25,10 @@ class SkillSwapAPITester:
             print(f"❌ {name} - FAILED {details}")
         return success
 
-    def run_test(self, name, method, endpoint, expected_status, data=None, params=None):
+    def run_test(self, name, method, endpoint, expected_status, data=None, params=None, extra_headers=None):
         """Run a single API test"""
         url = f"{self.base_url}/{endpoint}"
-        headers = {'Content-Type': 'application/json'}
+        headers = {'Content-Type': 'application/json', **(extra_headers or {})}
         
         try:
             if method == 'GET':
@@ -354,6 +355,67 @@ class SkillSwapAPITester:
 
         return success
 
+    @staticmethod
+    def participants_embedded(req):
+        """Check both participant summaries are present and match the swap"""
+        requester, receiver = req.get('requester'), req.get('receiver')
+        return (
+            bool(requester) and requester.get('id') == req['requester_id'] and
+            bool(receiver) and receiver.get('id') == req['receiver_id']
+        )
+
+    def test_batch_lookup_endpoints(self):
+        """Test batch user lookup and participant expansion"""
+        print("\n🔍 Testing Batch Lookup Endpoints...")
+        
+        if len(self.test_users) < 2:
+            self.log_test("Batch Lookup Tests", False, "Need at least 2 test users")
+            return False
+
+        user_ids = [user['id'] for user in self.test_users[:2]]
+        
+        success, response = self.run_test(
+            "Batch Get Users",
+            "GET",
+            "users",
+            200,
+            params={"ids": ",".join(user_ids)}
+        )
+        
+        if success and sorted(user['id'] for user in response) == sorted(user_ids):
+            self.log_test("Batch Users Match", True, f"Found {len(response)} users")
+        else:
+            self.log_test("Batch Users Match", False)
+
+        success, response = self.run_test(
+            "Get Swap Requests With Participants",
+            "GET",
+            "swap-requests",
+            200,
+            params={"user_id": user_ids[0], "expand": "participants"}
+        )
+        
+        if success and response and all(self.participants_embedded(req) for req in response):
+            self.log_test("Participant Summaries Embedded", True)
+        else:
+            self.log_test("Participant Summaries Embedded", False)
+
+        success, response = self.run_test(
+            "Get Dashboard With Participants",
+            "GET",
+            f"dashboard/{user_ids[0]}",
+            200,
+            params={"expand": "participants"}
+        )
+        
+        sent_requests = response.get('sent_requests', []) if success else []
+        if sent_requests and all(self.participants_embedded(req) for req in sent_requests):
+            self.log_test("Dashboard Participant Summaries", True)
+        else:
+            self.log_test("Dashboard Participant Summaries", False)
+
+        return success
+
     def test_search_endpoints(self):
         """Test search functionality"""
         print("\n🔍 Testing Search Endpoints...")
@@ -427,6 +489,240 @@ class SkillSwapAPITester:
 
         return True
 
+    def test_idempotency(self):
+        """Test Idempotency-Key replay on write endpoints"""
+        print("\n🔍 Testing Idempotency Keys...")
+        
+        idempotency_key = str(uuid.uuid4())
+        user_data = {
+            "name": "Retry Tester",
+            "email": f"retry_{datetime.now().strftime('%H%M%S%f')}@example.com"
+        }
+        
+        responses = []
+        for attempt in range(2):
+            success, response = self.run_test(
+                f"Create User With Idempotency-Key (attempt {attempt + 1})",
+                "POST",
+                "users",
+                200,
+                data=user_data,
+                extra_headers={"Idempotency-Key": idempotency_key}
+            )
+            responses.append(response)
+        
+        if success and responses[0].get('id') and responses[0].get('id') == responses[1].get('id'):
+            self.log_test("Idempotent Replay", True, "Retry returned the original user")
+        else:
+            self.log_test("Idempotent Replay", False)
+
+        # Reusing the key for a different body must be rejected
+        success, _ = self.run_test(
+            "Reuse Idempotency-Key With Different Body",
+            "POST",
+            "users",
+            422,
+            data={**user_data, "name": "Someone Else"},
+            extra_headers={"Idempotency-Key": idempotency_key}
+        )
+
+        if len(self.test_users) < 2:
+            self.log_test("Swap Request Idempotency Tests", False, "Need at least 2 users")
+            return False
+
+        swap_key = str(uuid.uuid4())
+        swap_data = {
+            "receiver_id": self.test_users[1]['id'],
+            "requester_skill": f"Retry Skill {datetime.now().strftime('%H%M%S%f')}",
+            "receiver_skill": "Design"
+        }
+        endpoint = f"swap-requests?requester_id={self.test_users[0]['id']}"
+        
+        responses = []
+        for attempt in range(2):
+            success, response = self.run_test(
+                f"Create Swap Request With Idempotency-Key (attempt {attempt + 1})",
+                "POST",
+                endpoint,
+                200,
+                data=swap_data,
+                extra_headers={"Idempotency-Key": swap_key}
+            )
+            responses.append(response)
+        
+        if success and responses[0].get('id') and responses[0].get('id') == responses[1].get('id'):
+            self.log_test("Idempotent Swap Replay", True, "Retry returned the original swap request")
+        else:
+            self.log_test("Idempotent Swap Replay", False)
+
+        # Without a key the duplicate is caught by the unique pending swap index
+        success, _ = self.run_test(
+            "Create Duplicate Pending Swap Without Key",
+            "POST",
+            endpoint,
+            409,
+            data=swap_data
+        )
+
+        return success
+
+    def test_pending_swap_uniqueness(self):
+        """Test that at most one pending swap exists per users/skills tuple"""
+        print("\n🔍 Testing Pending Swap Uniqueness...")
+        
+        if len(self.test_users) < 2:
+            self.log_test("Pending Swap Uniqueness Tests", False, "Need at least 2 users")
+            return False
+
+        suffix = datetime.now().strftime('%H%M%S%f')
+        request_data = {
+            "receiver_id": self.test_users[1]['id'],
+            "requester_skill": f"Unique Skill {suffix}",
+            "receiver_skill": "Design"
+        }
+        endpoint = f"swap-requests?requester_id={self.test_users[0]['id']}"
+        
+        success, first = self.run_test("Create Swap A", "POST", endpoint, 200, data=request_data)
+        if not success:
+            return False
+
+        self.run_test("Reject Swap A", "PUT", f"swap-requests/{first['id']}", 200, data={"status": "rejected"})
+        self.run_test("Create Swap B With Same Tuple", "POST", endpoint, 200, data=request_data)
+
+        # Reopening A would leave two pending swaps for the same tuple
+        success, _ = self.run_test(
+            "Reopen Swap A Over Pending Swap B",
+            "PUT",
+            f"swap-requests/{first['id']}",
+            409,
+            data={"status": "pending"}
+        )
+
+        return success
+
+    def test_moderation_endpoints(self):
+        """Test bulk ban/unban and status enforcement"""
+        print("\n🔍 Testing Moderation Endpoints...")
+        
+        moderation_token = os.environ.get("MODERATION_TOKEN")
+        if not moderation_token:
+            print("⏭️  Skipping moderation tests: set MODERATION_TOKEN to the server's token")
+            return True
+        moderator_headers = {"X-Moderation-Token": moderation_token}
+
+        success, user = self.run_test(
+            "Create User To Moderate",
+            "POST",
+            "users",
+            200,
+            data={"name": "Moderated User", "email": f"moderated_{datetime.now().strftime('%H%M%S%f')}@example.com"}
+        )
+        if not success:
+            return False
+
+        if not self.test_users:
+            self.log_test("Moderation Tests", False, "No test users available")
+            return False
+
+        moderated_skill = f"Moderated Skill {datetime.now().strftime('%H%M%S%f')}"
+        self.run_test(
+            "Give Moderated User A Skill",
+            "PUT",
+            f"users/{user['id']}",
+            200,
+            data={"skills_offered": [moderated_skill]}
+        )
+
+        swap_data = {
+            "receiver_id": user['id'],
+            "requester_skill": "Python",
+            "receiver_skill": moderated_skill
+        }
+        success, swap = self.run_test(
+            "Create Swap To Moderated User",
+            "POST",
+            f"swap-requests?requester_id={self.test_users[0]['id']}",
+            200,
+            data=swap_data
+        )
+        if not success:
+            return False
+
+        self.run_test(
+            "Bulk Ban Without Token",
+            "POST",
+            "moderation/users",
+            401,
+            data={"ban": [user['id']]}
+        )
+
+        success, response = self.run_test(
+            "Bulk Ban Users",
+            "POST",
+            "moderation/users",
+            200,
+            data={"ban": [user['id']]},
+            extra_headers=moderator_headers
+        )
+        if success and response.get('users_modified') == 1 and response.get('swaps_cancelled', 0) > 0:
+            self.log_test("Bulk Ban Result", True, f"Cancelled {response['swaps_cancelled']} swaps")
+        else:
+            self.log_test("Bulk Ban Result", False)
+
+        success, response = self.run_test(
+            "Get Banned User's Swap Requests",
+            "GET",
+            "swap-requests",
+            200,
+            params={"user_id": user['id']}
+        )
+        cancelled = [req for req in response if req['id'] == swap['id']] if success else []
+        if cancelled and cancelled[0]['status'] == 'cancelled':
+            self.log_test("Pending Swap Cancelled On Ban", True)
+        else:
+            self.log_test("Pending Swap Cancelled On Ban", False)
+
+        self.run_test("Get Banned User", "GET", f"users/{user['id']}", 404)
+
+        success, response = self.run_test("Get Users After Ban", "GET", "users", 200)
+        if success and all(u['id'] != user['id'] for u in response):
+            self.log_test("Banned User Hidden From Users List", True)
+        else:
+            self.log_test("Banned User Hidden From Users List", False)
+
+        success, response = self.run_test(
+            "Search Banned User's Skill",
+            "GET",
+            "search/skills",
+            200,
+            params={"query": moderated_skill}
+        )
+        if success and moderated_skill not in response.get('skills', []):
+            self.log_test("Banned User Hidden From Skill Search", True)
+        else:
+            self.log_test("Banned User Hidden From Skill Search", False)
+
+        self.run_test(
+            "Create Swap To Banned User",
+            "POST",
+            f"swap-requests?requester_id={self.test_users[0]['id']}",
+            404,
+            data=swap_data
+        )
+
+        success, response = self.run_test(
+            "Bulk Unban Users",
+            "POST",
+            "moderation/users",
+            200,
+            data={"unban": [user['id']]},
+            extra_headers=moderator_headers
+        )
+
+        self.run_test("Get Unbanned User", "GET", f"users/{user['id']}", 200)
+
+        return success
+
     def run_all_tests(self):
         """Run all test suites"""
         print("🚀 Starting Skill Swap Platform API Tests...")
@@ -436,6 +732,10 @@ class SkillSwapAPITester:
         self.test_user_endpoints()
         self.test_swap_request_endpoints()
         self.test_dashboard_endpoint()
+        self.test_batch_lookup_endpoints()
+        self.test_idempotency()
+        self.test_pending_swap_uniqueness()
+        self.test_moderation_endpoints()
         self.test_search_endpoints()
         self.test_rating_endpoints()
         
@@ -0,0 +1,151 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+pytest.importorskip("typer")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import analytics_export  # noqa: E402
+
+T0 = datetime(2026, 1, 1)
+
+
+class FakeCollection:
+    """Runs the $addFields/$match/$sort/$project pipeline export_collection builds."""
+
+    def __init__(self, name, docs):
+        self.name = name
+        self.docs = docs
+
+    def aggregate(self, pipeline, **kwargs):
+        docs = [dict(doc) for doc in self.docs]
+        for stage in pipeline:
+            (op, spec), = stage.items()
+            if op == "$addFields":
+                for field, expr in spec.items():
+                    first, fallback = (name.lstrip("$") for name in expr["$ifNull"])
+                    for doc in docs:
+                        doc[field] = doc.get(first) or doc.get(fallback)
+            elif op == "$match":
+                (field, cond), = spec.items()
+                docs = [doc for doc in docs if doc[field] >= cond["$gte"]]
+            elif op == "$sort":
+                (field, direction), = spec.items()
+                docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+            elif op == "$project":
+                docs = [{k: v for k, v in doc.items() if spec.get(k)} for doc in docs]
+        return iter(docs)
+
+
+def make_user(i, **kwargs):
+    user = {
+        "id": str(i),
+        "name": f"User {i}",
+        "email": f"user{i}@example.com",
+        "skills_offered": [],
+        "skills_wanted": [],
+        "is_public": True,
+        "status": "active",
+        "created_at": T0 + timedelta(days=i),
+    }
+    user.update(kwargs)
+    return user
+
+
+def test_export_collection_partitions_by_day_and_returns_watermark(tmp_path):
+    users = FakeCollection("users", [make_user(i) for i in range(3)])
+
+    watermark = analytics_export.export_collection(users, tmp_path / "users", "updated_at", None, 2)
+
+    assert watermark == T0 + timedelta(days=2)
+    partitions = sorted(p.name for p in (tmp_path / "users").iterdir())
+    assert partitions == ["dt=2026-01-01", "dt=2026-01-02", "dt=2026-01-03"]
+    assert len(analytics_export.read_dataset(tmp_path, "users")) == 3
+
+
+def test_export_collection_rereads_from_since(tmp_path):
+    users = FakeCollection("users", [make_user(i) for i in range(3)])
+
+    analytics_export.export_collection(
+        users, tmp_path / "users", "updated_at", T0 + timedelta(days=1), 10
+    )
+
+    assert sorted(analytics_export.read_dataset(tmp_path, "users")["id"]) == ["1", "2"]
+
+
+def test_incremental_export_picks_up_user_edits(tmp_path):
+    docs = [make_user(0), make_user(1)]
+    users = FakeCollection("users", docs)
+    watermark = analytics_export.export_collection(users, tmp_path / "users", "updated_at", None, 10)
+    docs[0].update(skills_offered=["Python"], updated_at=watermark + timedelta(days=5))
+
+    analytics_export.export_collection(users, tmp_path / "users", "updated_at", watermark + timedelta(days=1), 10)
+
+    df = analytics_export.read_dataset(tmp_path, "users").set_index("id")
+    assert df.loc["0", "skills_offered"].tolist() == ["Python"]
+    assert df.loc["1", "updated_at"] == df.loc["1", "created_at"]
+
+
+def test_read_dataset_keeps_latest_export_of_each_document(tmp_path):
+    docs = [make_user(0)]
+    users = FakeCollection("users", docs)
+    analytics_export.export_collection(users, tmp_path / "users", "updated_at", None, 10)
+    docs[0]["status"] = "banned"
+    analytics_export.export_collection(users, tmp_path / "users", "updated_at", T0, 10)
+
+    df = analytics_export.read_dataset(tmp_path, "users")
+
+    assert df["status"].tolist() == ["banned"]
+    assert "exported_at" not in df.columns
+
+
+def test_skill_supply_demand_is_case_insensitive():
+    users = pd.DataFrame({
+        "skills_offered": [["Python", "Cooking"], ["python"], []],
+        "skills_wanted": [["Design"], ["Python"], ["design", "python"]],
+        "status": "active",
+        "is_public": True,
+    })
+
+    report = analytics_export.skill_supply_demand(users)
+
+    assert report.loc["python"].tolist() == [2, 2, 1.0]
+    assert report.loc["design", "supply"] == 0
+    assert pd.isna(report.loc["design", "demand_ratio"])
+    assert report.loc["cooking", "demand"] == 0
+
+
+def test_swap_conversion_rates():
+    swaps = pd.DataFrame({"status": ["pending", "accepted", "completed", "rejected", "cancelled"]})
+
+    rates = analytics_export.swap_conversion_rates(swaps)
+
+    assert rates["total"] == 5
+    assert rates["acceptance_rate"] == pytest.approx(2 / 3)
+    assert rates["completion_rate"] == pytest.approx(1 / 5)
+
+
+def test_swap_conversion_rates_without_swaps():
+    rates = analytics_export.swap_conversion_rates(pd.DataFrame())
+
+    assert rates["total"] == 0
+    assert pd.isna(rates["acceptance_rate"])
+    assert pd.isna(rates["completion_rate"])
+
+
+def test_skill_supply_demand_skips_banned_and_private_users():
+    users = pd.DataFrame({
+        "skills_offered": [["Python"], ["Cooking"], ["Design"]],
+        "skills_wanted": [[], ["Python"], ["Python"]],
+        "status": ["active", "banned", "active"],
+        "is_public": [True, True, False],
+    })
+
+    report = analytics_export.skill_supply_demand(users)
+
+    assert report.index.tolist() == ["python"]
+    assert report.loc["python", "demand"] == 0